@@ -1,10 +1,15 @@
 import base64
+import io
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable, Sequence
 
 from docx import Document
 from docx.enum.section import WD_ORIENTATION, WD_SECTION
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
 from docx.shared import Inches, Pt
+from docx.table import Table
 
 OUTPUT_DIR = Path(__file__).resolve().parent.parent / "tests" / "typesetting" / "samples"
 
@@ -12,21 +17,29 @@ PNG_BASE64 = (
     "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMCAO+0"
     "FtkAAAAASUVORK5CYII="
 )
+PNG_BYTES = base64.b64decode(PNG_BASE64)
 
 
 def ensure_output_dir() -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def write_png(path: Path) -> None:
-    payload = base64.b64decode(PNG_BASE64)
-    path.write_bytes(payload)
-
-
 def save_doc(doc: Document, name: str) -> None:
     doc.save(OUTPUT_DIR / name)
 
 
+def fill_rows(table: Table, rows: Sequence[Sequence[str]], start: int = 0) -> None:
+    # Append runs to each cell's existing empty paragraph directly, skipping
+    # the per-cell clear/add_p/add_r work done by the Cell.text setter.
+    for tr, values in zip(table._tbl.tr_lst[start:], rows):
+        for tc, value in zip(tr.tc_lst, values):
+            run = OxmlElement("w:r")
+            text = OxmlElement("w:t")
+            text.text = value
+            run.append(text)
+            tc.p_lst[0].append(run)
+
+
 def make_basic_paragraphs() -> None:
     doc = Document()
     title = doc.add_heading("Basic Paragraphs", level=1)
@@ -80,9 +93,10 @@ def make_table_simple() -> None:
     doc = Document()
     doc.add_heading("Simple Table", level=1)
     table = doc.add_table(rows=3, cols=3)
-    for row_index, row in enumerate(table.rows, start=1):
-        for col_index, cell in enumerate(row.cells, start=1):
-            cell.text = f"R{row_index}C{col_index}"
+    fill_rows(
+        table,
+        [[f"R{row_index}C{col_index}" for col_index in range(1, 4)] for row_index in range(1, 4)],
+    )
     save_doc(doc, "table-simple.docx")
 
 
@@ -92,9 +106,11 @@ def make_table_merge() -> None:
     table = doc.add_table(rows=3, cols=3)
     table.cell(0, 0).merge(table.cell(0, 2))
     table.cell(0, 0).text = "Merged header"
-    for row_index in range(1, 3):
-        for col_index in range(3):
-            table.cell(row_index, col_index).text = f"{row_index}-{col_index}"
+    fill_rows(
+        table,
+        [[f"{row_index}-{col_index}" for col_index in range(3)] for row_index in range(1, 3)],
+        start=1,
+    )
     save_doc(doc, "table-merge.docx")
 
 
@@ -102,9 +118,7 @@ def make_image_inline() -> None:
     doc = Document()
     doc.add_heading("Inline Image", level=1)
     doc.add_paragraph("Image below should scale to width.")
-    image_path = OUTPUT_DIR / "sample-image.png"
-    write_png(image_path)
-    doc.add_picture(str(image_path), width=Inches(3.0))
+    doc.add_picture(io.BytesIO(PNG_BYTES), width=Inches(3.0))
     doc.add_paragraph("Caption: 3 inch wide image.")
     save_doc(doc, "image-inline.docx")
 
@@ -168,16 +182,10 @@ def make_mixed_layout() -> None:
     doc.add_paragraph("Check two", style="List Bullet")
 
     table = doc.add_table(rows=2, cols=2)
-    table.cell(0, 0).text = "A"
-    table.cell(0, 1).text = "B"
-    table.cell(1, 0).text = "C"
-    table.cell(1, 1).text = "D"
-
-    image_path = OUTPUT_DIR / "sample-image.png"
-    if not image_path.exists():
-        write_png(image_path)
+    fill_rows(table, [["A", "B"], ["C", "D"]])
+
     doc.add_paragraph("Image: ")
-    doc.add_picture(str(image_path), width=Inches(2.5))
+    doc.add_picture(io.BytesIO(PNG_BYTES), width=Inches(2.5))
 
     doc.add_page_break()
     doc.add_heading("Second Page", level=1)
@@ -185,18 +193,28 @@ def make_mixed_layout() -> None:
     save_doc(doc, "mixed-layout.docx")
 
 
+SAMPLE_GENERATORS = (
+    make_basic_paragraphs,
+    make_lists_and_indent,
+    make_table_simple,
+    make_table_merge,
+    make_image_inline,
+    make_header_footer,
+    make_page_breaks,
+    make_sections_margins,
+    make_styles_headings,
+    make_mixed_layout,
+)
+
+
+def run_generator(generator: Callable[[], None]) -> None:
+    generator()
+
+
 def main() -> None:
     ensure_output_dir()
-    make_basic_paragraphs()
-    make_lists_and_indent()
-    make_table_simple()
-    make_table_merge()
-    make_image_inline()
-    make_header_footer()
-    make_page_breaks()
-    make_sections_margins()
-    make_styles_headings()
-    make_mixed_layout()
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(run_generator, SAMPLE_GENERATORS))
 
 
 if __name__ == "__main__":
@@ -3,106 +3,609 @@ PP-Structure PDF 解析服务
 使用 PaddleOCR 的 PP-Structure 实现 PDF 文档结构分析
 
 安装依赖：
-pip install flask paddleocr paddlepaddle pymupdf
+pip install -r requirements-pp-structure.txt
 
-运行：
+运行（生产）：
+WEB_CONCURRENCY=2 gunicorn -k gthread --threads 4 -b 0.0.0.0:8080 pp_structure_server:app
+
+每个 worker 进程各自加载一份 PP-Structure 模型，worker 数应保持很小：
+GPU 上每块卡 1 个 worker，纯 CPU 时 2~4 个即可。
+worker 数通过 WEB_CONCURRENCY 设置（gunicorn 以其作为默认 -w），不要再单独传 -w：
+服务同样读取该变量，在各 worker 之间均分 CPU 推理线程和 GPU 槽位；
+手动设置 GPU_SLOTS 时按单个 worker 计。
+
+运行（开发）：
 python pp_structure_server.py
 """
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import hashlib
 import os
+import queue
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import fitz  # PyMuPDF
+
+# NPU 上关闭 JIT 编译，否则首张图片会因在线编译极慢；需在导入 Paddle 前设置
+USE_NPU = os.environ.get('USE_NPU', '').lower() in ('1', 'true', 'yes')
+if USE_NPU:
+    os.environ.setdefault('FLAGS_npu_jit_compile', '0')
+
+import paddleocr
 try:
     from paddleocr import PPStructure
 except ImportError:
     # 新版本使用 PaddleOCR
     from paddleocr import PaddleOCR
     PPStructure = None
-import json
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Iterator, Optional
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域
 
-# 初始化 PP-Structure 或 PaddleOCR
-if PPStructure:
-    # 旧版本
-    pp_structure = PPStructure(
-        layout=True,
-        table=True,
-        ocr=True,
-        show_log=False
-    )
-else:
+def detect_gpu() -> bool:
+    """检测是否可以使用 GPU 推理，可通过环境变量 USE_GPU=0/1 强制指定"""
+    use_gpu = os.environ.get('USE_GPU')
+    if use_gpu is not None:
+        return use_gpu.lower() in ('1', 'true', 'yes')
+    if os.environ.get('CUDA_VISIBLE_DEVICES') in ('', '-1'):
+        return False
+    try:
+        import paddle
+        # GPU 版 wheel 在无卡的机器上也会 is_compiled_with_cuda()，还需确认确有可用设备
+        return paddle.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+    except ImportError:
+        return False
+
+USE_GPU = detect_gpu()
+
+# TensorRT 需单独安装，默认关闭；USE_TENSORRT=1 时在 GPU 上启用 TensorRT FP16
+USE_TENSORRT = USE_GPU and os.environ.get('USE_TENSORRT', '').lower() in ('1', 'true', 'yes')
+
+# gunicorn worker 进程数，取自 gunicorn 默认 -w 所用的 WEB_CONCURRENCY，各进程按此均分 CPU 资源
+WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+
+def inference_options() -> Dict[str, Any]:
+    """
+    推理后端加速选项：CPU 启用 MKLDNN，GPU 可选启用 TensorRT FP16
+    CPU 上识别本就逐条执行，rec_batch_num=1 不损失吞吐且大幅降低内存占用；GPU 保留批量识别
+    """
+    options = {
+        'use_gpu': USE_GPU,
+        'use_npu': USE_NPU,
+        'enable_mkldnn': True,
+        'cpu_threads': max(1, (os.cpu_count() or 1) // WORKERS),
+    }
+    if USE_TENSORRT:
+        options['use_tensorrt'] = True
+        options['precision'] = 'fp16'
+    if USE_GPU:
+        options['rec_batch_num'] = 6
+    else:
+        options['rec_batch_num'] = 1
+    return options
+
+def build_model(**options):
+    """初始化 PP-Structure 或 PaddleOCR"""
+    if PPStructure:
+        # 旧版本
+        return PPStructure(
+            layout=True,
+            table=True,
+            ocr=True,
+            show_log=False,
+            **options
+        )
     # 新版本使用 PaddleOCR
-    pp_structure = PaddleOCR(
+    return PaddleOCR(
         use_angle_cls=True,
         lang='ch',
-        show_log=False
+        show_log=False,
+        **options
     )
 
-def pdf_to_images(pdf_path: str) -> List[tuple]:
+def create_model():
     """
-    将 PDF 转换为图片
-    返回: [(page_index, image_path, width, height), ...]
+    按 inference_options 创建模型
+    TensorRT 初始化失败时去掉 use_tensorrt/precision 重试，其他错误照常抛出
+    返回: (model, options)，options 为实际生效的选项
     """
-    doc = fitz.open(pdf_path)
-    images = []
-    temp_dir = "temp_pdf_images"
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        # 渲染为图片 (200 DPI)
-        pix = page.get_pixmap(matrix=fitz.Matrix(200/72, 200/72))
-        img_path = os.path.join(temp_dir, f"page_{page_num}.png")
-        pix.save(img_path)
-        
-        # 获取页面尺寸 (points)
-        rect = page.rect
-        images.append((page_num + 1, img_path, rect.width, rect.height))
-    
-    doc.close()
-    return images
+    options = inference_options()
+    try:
+        return build_model(**options), options
+    except Exception as e:
+        if not options.get('use_tensorrt'):
+            raise
+        print(f"TensorRT 初始化失败，改用默认 GPU 推理后端: {e}")
+        options.pop('use_tensorrt')
+        options.pop('precision')
+        return build_model(**options), options
+
+# 单个请求已提交但尚未取回结果的页数上限
+MAX_IN_FLIGHT = 8
+
+# 每个 GPU 槽位预留的显存 (MiB)，用于按空闲显存估算 GPU_SLOTS
+GPU_SLOT_MIB = 1024
+
+def detect_gpu_slots() -> int:
+    """
+    本 worker 进程允许同时进入推理阶段的页数，可通过环境变量 GPU_SLOTS 指定（按单个 worker 计）
+    未指定时按 nvidia-smi 报告的空闲显存估算并在 WORKERS 个进程间均分，无法获取时取 MAX_IN_FLIGHT
+    需在模型加载并预热之后调用，空闲显存才不包含模型自身占用
+    """
+    slots = os.environ.get('GPU_SLOTS')
+    if slots:
+        return max(1, int(slots))
+    if USE_GPU:
+        try:
+            output = subprocess.run(
+                ['nvidia-smi', '--query-gpu=memory.free', '--format=csv,noheader,nounits'],
+                capture_output=True, text=True, timeout=5, check=True
+            ).stdout
+            free_mib = int(output.splitlines()[0].strip())
+            return max(1, free_mib // GPU_SLOT_MIB // WORKERS)
+        except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+            pass
+    return MAX_IN_FLIGHT
+
+class InferenceScheduler:
+    """
+    PP-Structure 推理调度器
+    所有页面（包括并发请求）经 submit 排队，由唯一的后台线程依次送入模型；
+    模型只在调度线程中调用，避免多个请求线程同时争用同一个 predictor
+    """
+
+    def __init__(self, model, options: Dict[str, Any], slots: int):
+        self._model = model
+        self.options = options
+        # 本进程所有请求共享的推理槽位：页面提交时占用，推理完成后释放，
+        # 并发请求再多也不会有超过 slots 张图片同时排队或驻留在 GPU 上
+        self._slots = threading.BoundedSemaphore(slots)
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def resize(self, slots: int):
+        """调整推理槽位数，仅在调度器投入使用前调用"""
+        self._slots = threading.BoundedSemaphore(slots)
+
+    def submit(self, img: np.ndarray) -> Future:
+        """提交一页图片，返回结果 Future；推理槽位用尽时阻塞等待"""
+        slots = self._slots
+        slots.acquire()
+        future = Future()
+        # 释放获取时的那个信号量，resize 之后完成的旧任务不会误释放新的槽位
+        future.add_done_callback(lambda _: slots.release())
+        self._pending.put((img, future))
+        return future
+
+    def _loop(self):
+        # PP-Structure 2.x 的版面/表格流水线只接受单张图片，模型空闲即取下一张，不攒批等待
+        while True:
+            img, future = self._pending.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._model(img))
+            except Exception as e:
+                future.set_exception(e)
+
+# 预热：用合成页面跑几次推理，触发 cuDNN/TensorRT 调优等首次推理开销
+WARMUP_RUNS = 3
+
+def render_warmup_page() -> np.ndarray:
+    """
+    渲染一张带标题、正文和表格的合成页面
+    空白页上版面/检测什么都找不到，识别和表格模型不会被调用，起不到预热作用
+    """
+    with _FITZ_LOCK:
+        doc = fitz.open()
+        try:
+            page = doc.new_page()
+            page.insert_text((72, 90), "Lumina Note", fontsize=24)
+            for i in range(6):
+                page.insert_text(
+                    (72, 130 + i * 18),
+                    f"{i + 1}. The quick brown fox jumps over the lazy dog 0123456789",
+                    fontsize=11
+                )
+            # 4 行 3 列带边框表格
+            for row in range(4):
+                for col in range(3):
+                    cell = fitz.Rect(72 + col * 150, 280 + row * 28, 222 + col * 150, 308 + row * 28)
+                    page.draw_rect(cell, color=(0, 0, 0), width=1)
+                    page.insert_text((cell.x0 + 8, cell.y0 + 19), f"Cell {row}-{col}", fontsize=11)
+
+            zoom = _render_dpi(page.rect) / 72
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False, colorspace=fitz.csRGB)
+            return _pixmap_to_bgr(pix, pix.samples_mv)
+        finally:
+            doc.close()
+
+def warmup(scheduler: InferenceScheduler):
+    """
+    经调度器预热，使预热与实际推理在同一个调度线程中执行
+    MKLDNN (oneDNN) 的 primitive 缓存按线程保存，在其他线程中预热对调度线程无效
+    """
+    img = render_warmup_page()
+    for _ in range(WARMUP_RUNS):
+        scheduler.submit(img).result()
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> InferenceScheduler:
+    """
+    按进程加载并预热模型，创建推理调度器
+    gunicorn 的每个 worker 进程各自持有一个 predictor，互不争用；
+    fork 后（如 gunicorn --preload）子进程中没有调度线程，按 pid 判断并重新创建
+    """
+    global _scheduler, _scheduler_pid
+    if _scheduler is None or _scheduler_pid != os.getpid():
+        with _scheduler_lock:
+            if _scheduler is None or _scheduler_pid != os.getpid():
+                model, options = create_model()
+                scheduler = InferenceScheduler(model, options, 1)
+                warmup(scheduler)
+                # 预热后模型自身的显存占用已稳定，再按空闲显存确定槽位数
+                scheduler.resize(detect_gpu_slots())
+                _scheduler = scheduler
+                _scheduler_pid = os.getpid()
+    return _scheduler
+
+# 渲染队列容量：限制已渲染但尚未推理的页数，避免大 PDF 占满内存
+RENDER_QUEUE_SIZE = 4
+
+# 流水线结束标记
+_SENTINEL = None
+
+# 页面短边渲染为 TARGET_SHORT_PX 像素，最高不超过 MAX_RENDER_DPI
+# 文本检测本身仍会按 det_limit_side_len=960 (det_limit_type='max') 缩小长边，
+# 但文字识别和表格识别从渲染图上裁剪，默认值下 A4 约为 116 DPI，小字号或密集表格的识别精度
+# 低于 200 DPI 渲染；对精度要求高时可调大 PP_STRUCTURE_TARGET_SHORT_PX (如 1654 即 A4 200 DPI)
+TARGET_SHORT_PX = int(os.environ.get('PP_STRUCTURE_TARGET_SHORT_PX', '960'))
+MAX_RENDER_DPI = 200
+
+# 文本层字符数超过该值时视为数字 PDF 页面，直接读取文本层而不做 OCR
+# 需要表格识别时，仅对没有图片和矢量图形（表格线）的页面这样处理，否则仍走 PP-Structure
+TEXT_LAYER_MIN_CHARS = 20
+
+def extract_text_layer(text_dict: Dict, page_index: int) -> List[Dict]:
+    """
+    从 PDF 自带文本层 (page.get_text("dict") 的结果) 提取文本块和图片块
+    坐标本身就是 PDF 点，无需换算
+    """
+    elements = []
+    id_prefix = f'el_{page_index}_'
+
+    for idx, block in enumerate(text_dict["blocks"]):
+        if block.get("type") == 0:  # 文本块
+            # 提取块内所有行的文本
+            text = "\n".join(
+                "".join(span.get("text", "") for span in line.get("spans", []))
+                for line in block.get("lines", [])
+            ).strip()
+            if text:
+                elements.append({
+                    'id': f'{id_prefix}{idx}',
+                    'type': 'text',
+                    'bbox': list(block["bbox"]),
+                    'pageIndex': page_index,
+                    'content': text,
+                })
+
+        elif block.get("type") == 1:  # 图片块
+            elements.append({
+                'id': f'{id_prefix}{idx}',
+                'type': 'image',
+                'bbox': list(block["bbox"]),
+                'pageIndex': page_index,
+            })
+
+    return elements
+
+def _ensure_private_dir(path: str):
+    """
+    创建仅当前用户可访问 (0700) 的目录，用于保存文档内容或解析结果
+    默认位于共享的临时目录下：已存在但属于其他用户时拒绝使用，以免结果被他人读取或伪造；
+    属于当前用户但权限过宽时收紧为 0700
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.name != 'posix':
+        return
+    st = os.stat(path)
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"目录 {path} 属于其他用户，拒绝使用")
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+# 识别结果缓存：按渲染后页面像素的哈希保存 blocks，重复页面无需再次推理
+# PP_STRUCTURE_CACHE=0 关闭；最多保留 CACHE_MAX_ENTRIES 个文件，超出时删除最久未使用的
+# 缓存内容会直接作为解析结果返回，CACHE_DIR 仅当前用户可访问，属于其他用户时不使用缓存
+CACHE_ENABLED = os.environ.get('PP_STRUCTURE_CACHE', '1').lower() not in ('0', 'false', 'no')
+CACHE_DIR = os.environ.get('PP_STRUCTURE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pp_structure_cache'))
+CACHE_MAX_ENTRIES = int(os.environ.get('PP_STRUCTURE_CACHE_MAX_ENTRIES', '10000'))
+# 每写入这么多次缓存检查一次总量
+CACHE_PRUNE_INTERVAL = 100
+
+# 修改 parse_pp_structure_result、_TYPE_MAP 等会改变 blocks 的逻辑时递增，使旧缓存失效
+CACHE_VERSION = 1
+
+_cache_writes = 0
+_cache_writes_lock = threading.Lock()
+
+def cache_salt(options: Dict[str, Any]) -> Optional[bytes]:
+    """
+    缓存键中与像素无关的部分：缓存版本、PaddleOCR 版本与模型选项
+    缓存关闭或缓存目录不可用时返回 None
+    """
+    if not CACHE_ENABLED:
+        return None
+    try:
+        _ensure_private_dir(CACHE_DIR)
+    except OSError as e:
+        print(f"识别缓存目录不可用，本次不使用缓存: {e}")
+        return None
+    return orjson.dumps({
+        'version': CACHE_VERSION,
+        'backend': 'PPStructure' if PPStructure else 'PaddleOCR',
+        'paddleocr': getattr(paddleocr, '__version__', ''),
+        # 线程数不影响识别结果
+        'options': {k: v for k, v in options.items() if k != 'cpu_threads'},
+    }, option=orjson.OPT_SORT_KEYS)
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def _prune_cache():
+    """缓存文件数超过 CACHE_MAX_ENTRIES 时按修改时间删除最旧的"""
+    try:
+        entries = [entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.json')]
+        excess = len(entries) - CACHE_MAX_ENTRIES
+        if excess <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:excess]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"清理识别缓存失败: {e}")
+
+def load_cached_blocks(key: str, page_index: int) -> Optional[List[Dict]]:
+    """读取缓存的 blocks，并按当前页码重写 id 和 pageIndex"""
+    try:
+        with open(_cache_path(key), 'rb') as f:
+            blocks = orjson.loads(f.read())
+        # 更新修改时间，清理时优先保留常用页面
+        os.utime(_cache_path(key))
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+    id_prefix = f'el_{page_index}_'
+    for idx, block in enumerate(blocks):
+        block['id'] = f'{id_prefix}{idx}'
+        block['pageIndex'] = page_index
+    return blocks
+
+def save_cached_blocks(key: str, blocks: List[Dict]):
+    """写入缓存；失败只打印警告，不影响本次解析"""
+    try:
+        _ensure_private_dir(CACHE_DIR)
+        # 先写临时文件再替换，并发请求同一页面时不会读到写了一半的内容
+        tmp_path = f"{_cache_path(key)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(blocks, option=orjson.OPT_SERIALIZE_NUMPY))
+        os.replace(tmp_path, _cache_path(key))
+    except OSError as e:
+        print(f"写入识别缓存失败: {e}")
+        return
+
+    global _cache_writes
+    with _cache_writes_lock:
+        _cache_writes += 1
+        prune = _cache_writes % CACHE_PRUNE_INTERVAL == 0
+    if prune:
+        _prune_cache()
 
-def parse_pp_structure_result(result: List[Dict], page_index: int, page_width: float, page_height: float) -> List[Dict]:
+# PyMuPDF 没有线程支持，并发请求的渲染线程通过该锁串行调用 fitz
+_FITZ_LOCK = threading.Lock()
+
+def _render_dpi(rect) -> float:
+    return min(TARGET_SHORT_PX * 72 / min(rect.width, rect.height), MAX_RENDER_DPI)
+
+def _pixmap_to_bgr(pix, samples) -> np.ndarray:
+    # 直接使用像素缓冲区，避免 PNG 编码/解码
+    img = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    # RGB -> BGR（PaddleOCR 按 OpenCV 通道顺序处理），这是该页唯一一次像素拷贝
+    return np.ascontiguousarray(img[..., ::-1])
+
+def _render_page(page, page_num: int, salt: Optional[bytes], table_recognition: bool) -> tuple:
+    """
+    渲染单页为内存中的图片 (BGR ndarray)；页面带文本层或命中缓存时直接返回 blocks，不做推理
+    salt: cache_salt() 的结果，为 None 时不使用缓存
+    table_recognition: 为 True 时含图片或矢量图形的页面不走文本层，以便识别表格
+    返回: (page_index, image, width, height, scale, blocks, cache_key)
+        scale 为像素到 PDF 点的换算系数；blocks 不为 None 时 image 为 None
+    """
+    # 获取页面尺寸 (points)
+    rect = page.rect
+
+    if not table_recognition or (not page.get_images() and not page.get_drawings()):
+        blocks = extract_text_layer(page.get_text("dict"), page_num + 1)
+        if sum(len(block.get('content', '')) for block in blocks) > TEXT_LAYER_MIN_CHARS:
+            return (page_num + 1, None, rect.width, rect.height, 1.0, blocks, None)
+
+    dpi = _render_dpi(rect)
+    zoom = dpi / 72
+    # 渲染为不带 alpha 通道的 RGB 图片
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False, colorspace=fitz.csRGB)
+    scale = 72 / dpi
+
+    # samples_mv 直接暴露 pixmap 缓冲区，避免 pix.samples 的 bytes 拷贝
+    samples = pix.samples_mv
+
+    cache_key = None
+    if salt is not None:
+        # 像素相同但换算系数不同时 bbox 也不同，因此 scale 一并计入缓存键
+        hasher = hashlib.blake2b(samples, digest_size=16)
+        hasher.update(repr(scale).encode())
+        hasher.update(salt)
+        cache_key = hasher.hexdigest()
+        blocks = load_cached_blocks(cache_key, page_num + 1)
+        if blocks is not None:
+            return (page_num + 1, None, rect.width, rect.height, scale, blocks, None)
+
+    img = _pixmap_to_bgr(pix, samples)
+    return (page_num + 1, img, rect.width, rect.height, scale, None, cache_key)
+
+def pdf_to_images(pdf_path: str, salt: Optional[bytes], table_recognition: bool) -> Iterator[tuple]:
+    """
+    在流水线的渲染线程中逐页渲染 PDF，按页序产出
+    PyMuPDF 不支持多线程调用，渲染保持串行，靠流水线与推理阶段重叠
+    生成: (page_index, image, width, height, scale, blocks, cache_key)
+    """
+    with _FITZ_LOCK:
+        doc = fitz.open(pdf_path)
+        page_count = len(doc)
+    try:
+        for page_num in range(page_count):
+            # 每页释放一次锁，多个请求交替渲染
+            with _FITZ_LOCK:
+                item = _render_page(doc[page_num], page_num, salt, table_recognition)
+            yield item
+    finally:
+        with _FITZ_LOCK:
+            doc.close()
+
+def run_pipeline(pdf_path: str, table_recognition: bool = True) -> List[Dict]:
+    """
+    三段流水线：渲染 -> PP-Structure -> 结果转换（带文本层或命中缓存的页面跳过推理）
+    渲染与提交分别在独立线程中运行，推理由调度器完成，主线程负责结果转换，各阶段相互重叠
+    """
+    scheduler = get_scheduler()
+    salt = cache_salt(scheduler.options)
+    render_q = queue.Queue(maxsize=RENDER_QUEUE_SIZE)
+    # 同时限制已提交但未取回结果的页数，使调度器中排队的图片不会无限增长
+    parse_q = queue.Queue(maxsize=MAX_IN_FLIGHT)
+    errors = []
+
+    def render_worker():
+        try:
+            for item in pdf_to_images(pdf_path, salt, table_recognition):
+                render_q.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            render_q.put(_SENTINEL)
+
+    def submit_worker():
+        while True:
+            item = render_q.get()
+            if item is _SENTINEL:
+                break
+            if errors:
+                # 已有页面出错，本次请求注定失败：只取空渲染队列，不再提交推理
+                continue
+            page_index, img, width, height, scale, blocks, cache_key = item
+            if blocks is not None:
+                # 文本层页面或缓存命中，已有结果，无需推理
+                parse_q.put((page_index, None, width, height, scale, blocks, None))
+                continue
+            # 提交给 PP-Structure 调度器，不等待结果，后续页面可继续渲染和排队
+            parse_q.put((page_index, scheduler.submit(img), width, height, scale, None, cache_key))
+        parse_q.put(_SENTINEL)
+
+    threads = [
+        threading.Thread(target=render_worker, daemon=True),
+        threading.Thread(target=submit_worker, daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    pages = []
+    while True:
+        item = parse_q.get()
+        if item is _SENTINEL:
+            break
+        page_index, future, width, height, scale, blocks, cache_key = item
+        # 出错后仍继续取空队列，避免上游线程阻塞在 put 上
+        if errors:
+            continue
+        if future is not None:
+            try:
+                result = future.result()
+                # 转换结果
+                blocks = parse_pp_structure_result(result, page_index, width, height, scale)
+            except Exception as e:
+                errors.append(e)
+                continue
+            if cache_key is not None:
+                save_cached_blocks(cache_key, blocks)
+
+        pages.append({
+            'pageIndex': page_index,
+            'width': width,
+            'height': height,
+            'blocks': blocks
+        })
+
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+
+    return pages
+
+# PP-Structure 类型 -> 应用类型
+_TYPE_MAP = {
+    'text': 'text',
+    'title': 'text',
+    'figure': 'image',
+    'table': 'table',
+    'equation': 'equation',
+}
+
+def parse_pp_structure_result(result: List[Dict], page_index: int, page_width: float, page_height: float, scale: float) -> List[Dict]:
     """
     转换 PP-Structure 结果为标准格式
+    scale: 渲染图片像素到 PDF 点的换算系数 (72 / dpi)
     """
     elements = []
+
+    # 坐标归一化到 PDF 点：整页 bbox 一次性缩放
+    bboxes = np.array(
+        [item.get('bbox', (0, 0, 0, 0)) for item in result],
+        dtype=np.float64
+    ).reshape(-1, 4)
+    bboxes *= scale
+    id_prefix = f'el_{page_index}_'
     
-    for idx, item in enumerate(result):
-        bbox_orig = item.get('bbox', [0, 0, 0, 0])
+    # bbox 保持为 ndarray 行，由 orjson (OPT_SERIALIZE_NUMPY) 直接序列化
+    for idx, (item, bbox) in enumerate(zip(result, bboxes)):
         item_type = item.get('type', 'text')
         
-        # 坐标归一化到 PDF 点 (假设图片是 200 DPI 渲染的)
-        scale = 72 / 200
-        bbox = [
-            bbox_orig[0] * scale,
-            bbox_orig[1] * scale,
-            bbox_orig[2] * scale,
-            bbox_orig[3] * scale
-        ]
-        
         element = {
-            'id': f'el_{page_index}_{idx}',
-            'type': map_type(item_type),
+            'id': f'{id_prefix}{idx}',
+            'type': _TYPE_MAP.get(item_type, 'text'),
             'bbox': bbox,
             'pageIndex': page_index,
         }
         
         # 提取内容
-        if item_type == 'text':
-            element['content'] = item.get('res', {}).get('text', '')
-        elif item_type == 'title':
+        if item_type == 'text' or item_type == 'title':
             element['content'] = item.get('res', {}).get('text', '')
-            element['type'] = 'text'
         elif item_type == 'figure':
-            element['type'] = 'image'
             element['caption'] = item.get('res', {}).get('text', '')
         elif item_type == 'table':
-            element['type'] = 'table'
             # 表格内容可以是 HTML 或结构化数据
             element['content'] = str(item.get('res', ''))
         
@@ -110,16 +613,86 @@ def parse_pp_structure_result(result: List[Dict], page_index: int, page_width: f
     
     return elements
 
-def map_type(pp_type: str) -> str:
-    """映射 PP-Structure 类型到应用类型"""
-    type_map = {
-        'text': 'text',
-        'title': 'text',
-        'figure': 'image',
-        'table': 'table',
-        'equation': 'equation',
+def json_response(payload: Dict[str, Any]):
+    """使用 orjson 序列化响应，大型结构比 jsonify 快得多"""
+    return app.response_class(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        mimetype='application/json'
+    )
+
+def parse_structure(pdf_path: str, table_recognition: bool = True) -> Dict[str, Any]:
+    """解析 PDF 并返回文档结构"""
+    # 渲染、分析、转换三阶段流水线处理每一页
+    pages = run_pipeline(pdf_path, table_recognition)
+
+    return {
+        'pageCount': len(pages),
+        'pages': pages
     }
-    return type_map.get(pp_type, 'text')
+
+# 异步任务：状态写入 JOB_DIR 下的 JSON 文件，gunicorn 多个 worker 进程之间共享
+# 任务文件包含文档全文，JOB_DIR 仅当前用户可访问
+JOB_DIR = os.environ.get('PP_STRUCTURE_JOB_DIR', os.path.join(tempfile.gettempdir(), 'pp_structure_jobs'))
+JOB_WORKERS = int(os.environ.get('PP_STRUCTURE_JOB_WORKERS', '2'))
+# 任务文件保留时长（秒），超过后在新任务提交时清理；需远大于单个 PDF 的解析耗时
+JOB_TTL_SECONDS = int(os.environ.get('PP_STRUCTURE_JOB_TTL', '86400'))
+_job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+
+_JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOB_DIR, f"{job_id}.json")
+
+def _write_job(job_id: str, created: float, status: str, **fields):
+    """
+    写入任务状态，附带创建时间和所属进程 pid
+    所属 worker 进程被重启或 OOM 杀掉后，轮询方据此判断任务已中断
+    """
+    state = {'status': status, 'created': created, 'pid': os.getpid(), **fields}
+    # 先写临时文件再替换，轮询方不会读到写了一半的内容
+    tmp_path = _job_path(job_id) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(state, option=orjson.OPT_SERIALIZE_NUMPY))
+    os.replace(tmp_path, _job_path(job_id))
+
+def _run_job(job_id: str, created: float, pdf_path: str, table_recognition: bool):
+    _write_job(job_id, created, 'running')
+    try:
+        structure = parse_structure(pdf_path, table_recognition)
+        _write_job(job_id, created, 'done', structure=structure)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        _write_job(job_id, created, 'error', error=str(e))
+
+def _pid_alive(pid: int) -> bool:
+    """
+    判断任务所属进程是否仍在运行
+    仅在 POSIX 上探测：Windows 上信号 0 即 CTRL_C_EVENT，os.kill 会向控制台进程组发送 Ctrl+C
+    """
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _sweep_jobs():
+    """删除超过 JOB_TTL_SECONDS 未更新的任务文件"""
+    expire_before = time.time() - JOB_TTL_SECONDS
+    try:
+        entries = list(os.scandir(JOB_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < expire_before:
+                os.remove(entry.path)
+        except OSError:
+            pass
 
 @app.route('/parse', methods=['POST'])
 def parse_pdf():
@@ -131,7 +704,8 @@ def parse_pdf():
         "pdf_path": "/path/to/file.pdf",
         "layout_analysis": true,
         "table_recognition": true,
-        "ocr_engine": "paddleocr"
+        "ocr_engine": "paddleocr",
+        "async": false
     }
     
     返回：
@@ -141,6 +715,8 @@ def parse_pdf():
             "pages": [...]
         }
     }
+
+    "async": true 时立即返回 {"job_id": "..."} (202)，通过 GET /parse/<job_id> 轮询结果
     """
     try:
         data = request.json
@@ -148,48 +724,84 @@ def parse_pdf():
         
         if not pdf_path or not os.path.exists(pdf_path):
             return jsonify({'error': 'PDF file not found'}), 404
+
+        table_recognition = bool(data.get('table_recognition', True))
+
+        if data.get('async'):
+            _ensure_private_dir(JOB_DIR)
+            _sweep_jobs()
+            job_id = uuid.uuid4().hex
+            created = time.time()
+            _write_job(job_id, created, 'pending')
+            _job_executor.submit(_run_job, job_id, created, pdf_path, table_recognition)
+            return jsonify({'job_id': job_id}), 202
         
-        # 转换 PDF 为图片
-        images = pdf_to_images(pdf_path)
-        
-        # 解析每一页
-        pages = []
-        for page_index, img_path, width, height in images:
-            # 使用 PP-Structure 分析
-            result = pp_structure(img_path)
-            
-            # 转换结果
-            blocks = parse_pp_structure_result(result, page_index, width, height)
-            
-            pages.append({
-                'pageIndex': page_index,
-                'width': width,
-                'height': height,
-                'blocks': blocks
-            })
-            
-            # 清理临时图片
-            if os.path.exists(img_path):
-                os.remove(img_path)
-        
-        structure = {
-            'pageCount': len(pages),
-            'pages': pages
-        }
-        
-        return jsonify({'structure': structure})
+        return json_response({'structure': parse_structure(pdf_path, table_recognition)})
     
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/parse/<job_id>', methods=['GET'])
+def parse_job(job_id: str):
+    """
+    查询异步解析任务
+
+    返回：
+    {
+        "status": "pending" | "running" | "done" | "error",
+        "created": 1700000000.0,
+        "pid": 1234,
+        "structure": {...},  // status 为 done 时
+        "error": "..."       // status 为 error 时
+    }
+
+    任务文件在 JOB_TTL_SECONDS 后被清理，之后返回 404
+    """
+    if not _JOB_ID_RE.fullmatch(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+
+    try:
+        _ensure_private_dir(JOB_DIR)
+        with open(_job_path(job_id), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        # 任务不存在，或刚被其他 worker 的 _sweep_jobs 清理
+        return jsonify({'error': 'Job not found'}), 404
+    except OSError as e:
+        return jsonify({'error': str(e)}), 500
+
+    state = orjson.loads(data)
+    if state['status'] in ('pending', 'running') and not _pid_alive(state['pid']):
+        # 所属 worker 进程已退出，任务不会再有结果
+        state = {**state, 'status': 'error', 'error': 'Worker process exited before the job finished'}
+        return json_response(state)
+
+    # 任务文件本身就是 JSON，直接返回无需重新编码
+    return app.response_class(data, mimetype='application/json')
+
 @app.route('/health', methods=['GET'])
 def health():
     """健康检查"""
     return jsonify({'status': 'ok', 'backend': 'pp-structure'})
 
+def _reset_locks_after_fork():
+    # fork 时后台加载线程可能正持有这些锁，子进程中没有线程会再释放它们
+    global _scheduler_lock, _FITZ_LOCK
+    _scheduler_lock = threading.Lock()
+    _FITZ_LOCK = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+# 启动时即在后台线程中加载并预热模型，而不是等到第一个请求
+# 不在导入时同步加载：gunicorn worker 导入应用期间不发送心跳，首次下载模型加上预热
+# 超过 --timeout (默认 30 秒) 会被当作超时杀掉并反复重启；加载完成前到达的请求在 get_scheduler() 中等待
+# 开启 --preload 时 worker 会在首个请求时按 pid 重新加载，因此不建议使用 --preload
+threading.Thread(target=get_scheduler, daemon=True).start()
+
 if __name__ == '__main__':
     print("PP-Structure PDF 解析服务启动")
     print("API 地址: http://localhost:8080")
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    app.run(host='0.0.0.0', port=8080, threaded=True)